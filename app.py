@@ -1,423 +1,744 @@
 import streamlit as st
+import pandas as pd
 import base64
+import concurrent.futures
+import hashlib
+import hmac
+from utils.config import get_config
 from utils.report_generator import ReportGenerator
-from utils.supabase_client import SupabaseClient
+from utils.supabase_client import get_supabase_client
 import io
-from dotenv import load_dotenv
+from PIL import Image
 import logging
 from supabase import create_client  # Make sure to import this
-import os  # Make sure to import this
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Debug section - ADD THIS CODE HERE
+@st.cache_resource(show_spinner=False)
+def get_debug_client():
+    """One cached test client for the debug panel, rather than a fresh
+    connection per click."""
+    config = get_config()
+    url = config.supabase_url
+    key = config.supabase_key
+    if not url or not key:
+        raise ValueError("SUPABASE_URL or SUPABASE_KEY environment variables are missing")
+    return create_client(url, key)
+
 def test_supabase_connection():
     try:
-        # Create test client
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
-        if not url or not key:
-            return "SUPABASE_URL or SUPABASE_KEY environment variables are missing"
-        
-        client = create_client(url, key)
-        
-        # Test facilities table
-        facilities_response = client.table("facilities").select("count", count="exact").execute()
-        facilities_count = facilities_response.count if hasattr(facilities_response, 'count') else 0
-        
-        # Test impression lookup table
-        patterns_response = client.table("impression_lookup").select("count", count="exact").execute()
-        patterns_count = patterns_response.count if hasattr(patterns_response, 'count') else 0
-        
-        # Test unmatched findings table
-        unmatched_response = client.table("unmatched_findings").select("count", count="exact").execute()
-        unmatched_count = unmatched_response.count if hasattr(unmatched_response, 'count') else 0
-        
+        client = get_debug_client()
+
+        # One RPC returns all three table counts in a single round-trip.
+        # The debug_counts() SQL function lives in Supabase:
+        #   create or replace function debug_counts() returns json as $$
+        #     select json_build_object(
+        #       'facilities', (select count(*) from facilities),
+        #       'patterns', (select count(*) from impression_lookup),
+        #       'unmatched', (select count(*) from unmatched_findings))
+        #   $$ language sql stable;
+        try:
+            counts = client.rpc("debug_counts", {}).execute().data
+            facilities_count = counts.get("facilities", 0)
+            patterns_count = counts.get("patterns", 0)
+            unmatched_count = counts.get("unmatched", 0)
+        except Exception as e:
+            # The function may not be deployed yet - fall back to the three
+            # individual count queries rather than failing the debug check
+            logger.warning(f"debug_counts RPC unavailable, falling back to per-table counts: {e}")
+
+            facilities_response = client.table("facilities").select("count", count="exact").execute()
+            facilities_count = facilities_response.count if hasattr(facilities_response, 'count') else 0
+
+            patterns_response = client.table("impression_lookup").select("count", count="exact").execute()
+            patterns_count = patterns_response.count if hasattr(patterns_response, 'count') else 0
+
+            unmatched_response = client.table("unmatched_findings").select("count", count="exact").execute()
+            unmatched_count = unmatched_response.count if hasattr(unmatched_response, 'count') else 0
+
         return f"Connection successful. Facilities: {facilities_count}, Impression patterns: {patterns_count}, Unmatched findings: {unmatched_count}"
     except Exception as e:
         return f"Connection error: {str(e)}"
 
+# Cached resource factories - construct the clients once per server process
+# instead of on every script rerun, so the underlying HTTP sessions and their
+# keep-alive connections persist across interactions
+@st.cache_resource(show_spinner=False)
+def get_supabase():
+    return get_supabase_client()
+
+@st.cache_resource(show_spinner=False)
+def get_report_generator():
+    return ReportGenerator()
+
 # Initialize clients - EXISTING CODE STARTS AGAIN HERE
 try:
-    supabase = SupabaseClient()
-    report_generator = ReportGenerator()
+    supabase = get_supabase()
+    report_generator = get_report_generator()
     logger.info("Successfully initialized Supabase client and Report Generator")
 except Exception as e:
     logger.error(f"Error initializing services: {e}")
 
-# Set page config
-st.set_page_config(
-    page_title="RadReport AI",
-    page_icon="🏥",
-    layout="wide"
-)
+# Cached read helpers - these tables change rarely, so serve them from the
+# in-process cache instead of hitting Supabase on every Streamlit rerun
+@st.cache_data(ttl=300, show_spinner=False)
+def load_facilities():
+    """Return the facilities, a tuple of their names and a by-name index.
 
-# App title with separate subtitle in smaller text
-st.title("RadReport AI")
-st.markdown("<h3 style='margin-top:-15px; color: #6c757d;'>Multimodal Radiology Report Generator</h3>", unsafe_allow_html=True)
+    All three are computed once behind the cache: the tuple gives the
+    facility radio an identical (hashable) options value across reruns,
+    and the dict replaces per-rerun linear scans for a selected facility.
+    """
+    facilities = supabase.get_facilities()
+    facility_by_name = {f["name"]: f for f in facilities}
+    return facilities, tuple(facility_by_name), facility_by_name
 
-# Main content area
-col1, col2 = st.columns([1, 1])
-
-with col1:
-    # Study Type Selection
-    st.header("Study")
-    st.write("What kind of study was conducted?")
-    study_type = st.radio(
-        "Select study type",
-        ["Full Body", "Chest", "Abdomen and Pelvis"],
-        label_visibility="collapsed"
-    )
-    
-    # Facility Selection
-    st.header("Facility")
-    st.write("Where was the study conducted?")
-    
-    # Get facilities from database with error handling
+@st.cache_data(ttl=30, show_spinner=False)
+def load_impression_patterns():
+    return supabase.get_all_impression_patterns()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_unmatched_findings(limit=50):
+    return supabase.get_unmatched_findings(limit=limit)
+
+# Use the SIMD-accelerated pybase64 codec when available; it is a drop-in
+# replacement for the stdlib encoder
+try:
+    import pybase64 as b64codec
+except ImportError:
+    b64codec = base64
+
+# 48 KB is a multiple of 3, so each chunk's base64 output concatenates
+# cleanly with no padding between chunks
+B64_CHUNK_SIZE = 48 * 1024
+
+def hash_image_file(fp):
+    """Digest a file-like object in chunks without loading it whole."""
+    digest = hashlib.blake2b(digest_size=16)
+    fp.seek(0)
+    while True:
+        chunk = fp.read(B64_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    return digest.hexdigest()
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def encode_image_b64(file_digest, _fp):
+    """Base64-encode an uploaded image chunk by chunk, memoized on its
+    content digest so unrelated reruns don't re-encode the same upload.
+
+    Streaming keeps peak memory at one 48 KB chunk plus the output string
+    instead of holding bytes + encoded bytes + str copies of the whole
+    image at once. The file-like argument is underscore-prefixed so
+    Streamlit keys the cache on the digest alone.
+    """
+    out = []
+    _fp.seek(0)
+    while True:
+        chunk = _fp.read(B64_CHUNK_SIZE)
+        if not chunk:
+            break
+        # ascii skips UTF-8 probing - base64 output is always 7-bit
+        out.append(b64codec.b64encode(chunk).decode("ascii"))
+    return "".join(out)
+
+# Claude downsizes anything above this internally, so shrinking client-side
+# only removes bytes the API would discard anyway
+CLAUDE_MAX_IMAGE_DIM = 1568
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def prepare_image_for_claude(file_digest, _fp):
+    """Downscale the upload to Claude's pixel cap and re-encode as WebP.
+
+    A multi-MB PNG becomes a few hundred KB of WebP before base64, cutting
+    upload latency and vision-token cost. Returns (bytes, media_type);
+    falls back to the original bytes if Pillow can't parse the file.
+    """
+    _fp.seek(0)
     try:
-        facilities = supabase.get_facilities()
-        if not facilities or len(facilities) == 0:
-            st.error("No facilities found in the database. Please add facilities in the Admin section.")
-            facility = "No facility available"
-            facility_names = ["No facility available"]
-        else:
-            facility_names = [f["name"] for f in facilities]
-            facility = st.radio(
-                "Select facility",
-                facility_names,
-                label_visibility="collapsed"
-            )
+        img = Image.open(_fp)
+        img.thumbnail((CLAUDE_MAX_IMAGE_DIM, CLAUDE_MAX_IMAGE_DIM))
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=85)
+        return buf.getvalue(), "image/webp"
     except Exception as e:
-        st.error(f"Error retrieving facilities: {str(e)}")
-        facility = "Error"
-        facilities = []
-        facility_names = ["Error loading facilities"]
-    
-    # Dynamic sections based on study type
-    sections_data = {}
-    
-    if study_type in ["Full Body", "Chest"]:
-        st.header("Chest")
-        st.write("Findings")
-        chest_findings = st.text_area("Enter chest findings", height=150, key="chest", label_visibility="collapsed")
-        if chest_findings:
-            sections_data["chest"] = chest_findings
-    
-    if study_type in ["Full Body", "Abdomen and Pelvis"]:
-        st.header("Abdomen and Pelvis")
-        st.write("Findings")
-        abdomen_findings = st.text_area("Enter abdomen and pelvis findings", height=150, key="abdomen", label_visibility="collapsed")
-        if abdomen_findings:
-            sections_data["abdomen_pelvis"] = abdomen_findings
-    
-    # Image Upload
-    st.header("Upload Image")
-    uploaded_file = st.file_uploader("Upload a radiology image", type=["jpg", "jpeg", "png", "dcm"])
-    
-    image_data = None
-    if uploaded_file is not None:
-        # Handle DICOM files differently if needed
-        if uploaded_file.name.endswith('.dcm'):
-            # For v1, we'll just display a message
-            st.info("DICOM processing will be available in a future version")
+        logger.warning(f"Could not recompress image, sending original: {e}")
+        _fp.seek(0)
+        return _fp.read(), "image/jpeg"
+
+# Bound on memoized reports kept per session, FIFO-evicted
+REPORT_CACHE_MAX_ENTRIES = 32
+
+def cached_generate_report(facility, study_type, sections_items, image_digest, image_media_type, image_data, on_token=None):
+    """Memoize full report generation on its inputs.
+
+    Clicking Generate twice with nothing changed previously re-ran every
+    Claude call. The memo is a session-state dict rather than st.cache_data:
+    the streaming callback writes tokens into a placeholder created outside
+    this function, and Streamlit's cache replay can't reproduce element
+    writes to containers it doesn't know about (a cache hit would raise
+    CacheReplayClosureError). Only the finished report string is stored,
+    keyed on the facility, study type, findings and image digest - the
+    base64 payload and the callback stay out of the key.
+    """
+    cache = st.session_state.setdefault("report_cache", {})
+    key = (facility, study_type, sections_items, image_digest, image_media_type)
+    if key in cache:
+        return cache[key]
+
+    report = report_generator.generate_report(
+        facility, study_type, dict(sections_items), image_data,
+        image_media_type=image_media_type, on_token=on_token
+    )
+
+    if len(cache) >= REPORT_CACHE_MAX_ENTRIES:
+        cache.pop(next(iter(cache)))
+    cache[key] = report
+    return report
+
+# Which report sections each study type includes, and how each section is
+# presented - computed once at module scope instead of re-branching per rerun
+STUDY_SECTIONS = {
+    "Full Body": ("chest", "abdomen_pelvis"),
+    "Chest": ("chest",),
+    "Abdomen and Pelvis": ("abdomen_pelvis",),
+}
+
+SECTION_LABELS = {
+    "chest": ("Chest", "Enter chest findings"),
+    "abdomen_pelvis": ("Abdomen and Pelvis", "Enter abdomen and pelvis findings"),
+}
+
+# SHA-256 of the admin password - compare digests rather than plaintext
+ADMIN_PASSWORD_HASH = "ac9689e2272427085e35b9d3e3e8bed88cb3434828b43b86fc0596cad4c6e270"  # Replace with a secure password mechanism
+
+# Admin CRUD writes run on a small background pool so a click returns
+# immediately instead of freezing the tab for a Supabase round-trip. The
+# pool is a cached resource like the clients above - a module-level
+# executor would be rebuilt on every script rerun, leaking worker threads
+@st.cache_resource(show_spinner=False)
+def get_admin_write_executor():
+    return concurrent.futures.ThreadPoolExecutor(max_workers=4)
+
+
+def submit_admin_write(fn, args, success_msg, caches_to_clear):
+    """Run a Supabase write in the background instead of on the click path.
+
+    The pending future is parked in session state; _drain_admin_writes
+    picks it up on a later rerun, clears the affected read caches and
+    reports the outcome via st.toast. Until the write lands the cached
+    read data stays as-is, so the UI may briefly show the pre-write state.
+    """
+    future = get_admin_write_executor().submit(fn, *args)
+    st.session_state.setdefault("pending_writes", []).append(
+        (future, success_msg, caches_to_clear)
+    )
+    st.toast("Saving...")
+    # Drain right away: the grace period inside the drain lets a fast
+    # write finish and report on this very rerun, instead of waiting for
+    # the user's next interaction to pick it up
+    _drain_admin_writes()
+
+
+def _drain_admin_writes():
+    """Collect finished background writes and refresh the caches they touched.
+
+    Called at the start of the admin page and of every admin fragment:
+    clicks inside a fragment rerun only that fragment, so the fragment
+    itself must pick up results and escalate to a full rerun (st.rerun
+    defaults to app scope) once a write has landed.
+    """
+    pending = st.session_state.get("pending_writes", [])
+    if not pending:
+        return
+
+    # Give the writes a short grace period so the common case - a fast
+    # Supabase write submitted by this very click - resolves with its
+    # toast and cache refresh on the same rerun. Anything slower stays
+    # parked and is collected by a later drain.
+    concurrent.futures.wait([entry[0] for entry in pending], timeout=2)
+
+    still_pending = []
+    refreshed = False
+    for future, success_msg, caches_to_clear in pending:
+        if not future.done():
+            still_pending.append((future, success_msg, caches_to_clear))
+            continue
+        try:
+            success = future.result()
+        except Exception as e:
+            st.toast(f"Save failed: {str(e)}", icon="⚠️")
+            continue
+        if success:
+            for cache in caches_to_clear:
+                cache.clear()
+            st.toast(success_msg)
+            refreshed = True
         else:
-            # Convert to base64 for Claude
-            bytes_data = uploaded_file.getvalue()
-            image_data = base64.b64encode(bytes_data).decode()
-            st.image(bytes_data, caption="Uploaded Image", use_column_width=True)
-
-with col2:
-    st.header("Generated Report")
-    
-    # Generate and reset buttons
-    col_btn1, col_btn2 = st.columns([1, 1])
-    with col_btn1:
-        reset = st.button("↺ Reset")
-    with col_btn2:
-        generate = st.button("✓ Generate")
-    
-    # Report output area
-    report_container = st.container()
-    
-    if reset:
-        # Clear all form fields
-        st.session_state.clear()
-        st.experimental_rerun()
-    
-    if generate:
-        with st.spinner("Generating report..."):
-            if not sections_data:
-                report_container.error("Please enter findings for at least one section.")
-            elif facility in ["No facility available", "Error"]:
-                report_container.error("Please select a valid facility before generating a report.")
+            st.toast("Save failed", icon="⚠️")
+
+    st.session_state["pending_writes"] = still_pending
+    if refreshed:
+        st.rerun()
+
+
+def render_report_page():
+    """The main report generator page."""
+    # Main content area
+    col1, col2 = st.columns([1, 1])
+
+    with col1:
+        # Study Type Selection
+        st.header("Study")
+        st.write("What kind of study was conducted?")
+        study_type = st.radio(
+            "Select study type",
+            ["Full Body", "Chest", "Abdomen and Pelvis"],
+            label_visibility="collapsed"
+        )
+
+        # Facility Selection
+        st.header("Facility")
+        st.write("Where was the study conducted?")
+
+        # Get facilities from database with error handling
+        try:
+            facilities, facility_names, _ = load_facilities()
+            if not facilities or len(facilities) == 0:
+                st.error("No facilities found in the database. Please add facilities in the Admin section.")
+                facility = "No facility available"
+                facility_names = ["No facility available"]
             else:
-                try:
-                    report = report_generator.generate_report(
-                        facility, 
-                        study_type, 
-                        sections_data,
-                        image_data
-                    )
-                    
-                    report_container.text_area(
-                        "Generated Report", 
-                        report, 
-                        height=600
-                    )
-                    
-                    # Add download button
-                    report_bytes = report.encode()
-                    report_container.download_button(
-                        "Download Report",
-                        report_bytes,
-                        "radiology_report.txt",
-                        "text/plain"
-                    )
-                except Exception as e:
-                    report_container.error(f"Error generating report: {str(e)}")
-                    logger.error(f"Report generation failed: {e}")
+                facility = st.radio(
+                    "Select facility",
+                    facility_names,
+                    label_visibility="collapsed"
+                )
+        except Exception as e:
+            st.error(f"Error retrieving facilities: {str(e)}")
+            facility = "Error"
+            facilities = []
+            facility_names = ["Error loading facilities"]
 
-# Add a footer with version info
-st.markdown("---")
-st.markdown("<div style='text-align: center; color: #6c757d;'>RadReport AI v1.0 | &copy; 2025</div>", unsafe_allow_html=True)
+        # The findings inputs live inside a form so typing doesn't trigger a
+        # full script rerun per keystroke - the whole section is submitted once
+        # when the user clicks Generate
+        with st.form("report_form", clear_on_submit=False):
+            # Dynamic sections based on study type
+            sections_data = {}
+            for section in STUDY_SECTIONS[study_type]:
+                header, label = SECTION_LABELS[section]
+                st.header(header)
+                st.write("Findings")
+                findings_text = st.text_area(label, height=150, key=section, label_visibility="collapsed")
+                if findings_text:
+                    sections_data[section] = findings_text
 
-# Create additional pages (hidden in a menu in v1)
-menu = ["Report Generator", "Admin"]
-choice = st.sidebar.selectbox("Select Page", menu)
+            # Image Upload
+            st.header("Upload Image")
+            uploaded_file = st.file_uploader("Upload a radiology image", type=["jpg", "jpeg", "png", "dcm"])
 
-# Debug mode in sidebar - ADD THIS CODE HERE
-with st.sidebar:
-    debug_expand = st.expander("Debug Tools")
-    with debug_expand:
-        if 'debug_mode' not in st.session_state:
-            st.session_state.debug_mode = False
-        st.session_state.debug_mode = st.checkbox("Enable Debug Mode", value=st.session_state.debug_mode)
-        if st.session_state.debug_mode:
-            if st.button("Test Supabase Connection"):
-                connection_status = test_supabase_connection()
-                st.code(connection_status) 
-
-if choice == "Admin":
-    st.sidebar.info("Admin features are password protected")
-    password = st.sidebar.text_input("Enter admin password", type="password")
-    
-    if password == "admin1234":  # Replace with a secure password mechanism
-        st.sidebar.success("Admin access granted")
-        
-        admin_tabs = st.tabs(["Facilities", "Templates", "Impression Patterns", "Unmatched Findings"])
-        
-        # New Facilities tab
-        with admin_tabs[0]:
-            st.header("Facility Management")
-            
-            # Add new facility
-            st.subheader("Add New Facility")
-            
-            new_facility_name = st.text_input("Facility Name")
-            new_chest_template = st.text_area("Chest Technique Template", 
-                placeholder="e.g., Thin section axial images were obtained through the chest using a GE Lightspeed scanner. No intravenous contrast was used.",
-                height=100)
-            new_abdomen_template = st.text_area("Abdomen Technique Template",
-                placeholder="e.g., Thin section axial images were obtained through the abdomen and pelvis using a GE Lightspeed scanner. No intravenous contrast was used.",
-                height=100)
-            
-            if st.button("Add Facility"):
-                if new_facility_name and new_chest_template and new_abdomen_template:
+            image_file = None
+            if uploaded_file is not None:
+                # Handle DICOM files differently if needed
+                if uploaded_file.name.endswith('.dcm'):
+                    # For v1, we'll just display a message
+                    st.info("DICOM processing will be available in a future version")
+                else:
+                    # Pass the UploadedFile itself - Streamlit keys the preview on its
+                    # content hash, so the image isn't re-decoded on every rerun
+                    st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
+                    image_file = uploaded_file
+
+            generate = st.form_submit_button("✓ Generate")
+
+    with col2:
+        st.header("Generated Report")
+
+        # Reset button - Generate is the form's submit button in the left column.
+        # The on_click callback runs before the script body on the click's own
+        # rerun, so the form fields come up empty without a second full rerun
+        # (and without st.session_state.clear() wiping unrelated state)
+        def reset_form():
+            for key in SECTION_LABELS:
+                st.session_state.pop(key, None)
+
+        st.button("↺ Reset", on_click=reset_form)
+
+        # Report output area
+        report_container = st.container()
+
+        if generate:
+            with st.spinner("Generating report..."):
+                if not sections_data:
+                    report_container.error("Please enter findings for at least one section.")
+                elif facility in ["No facility available", "Error"]:
+                    report_container.error("Please select a valid facility before generating a report.")
+                else:
                     try:
-                        success = supabase.add_facility(
-                            new_facility_name,
-                            new_chest_template,
-                            new_abdomen_template
+                        # Only pay for the base64 encode once the user actually
+                        # submits; the preview above works from the raw upload
+                        image_digest = None
+                        image_data = None
+                        image_media_type = None
+                        if image_file is not None:
+                            image_digest = hash_image_file(image_file)
+                            compressed, image_media_type = prepare_image_for_claude(image_digest, image_file)
+                            image_data = encode_image_b64(image_digest, io.BytesIO(compressed))
+
+                        # Stream Claude's formatted findings into a placeholder
+                        # as they arrive, so the user sees progress instead of
+                        # a blank spinner for the full generation
+                        placeholder = report_container.empty()
+                        stream_buffer = []
+
+                        def stream_token(text):
+                            stream_buffer.append(text)
+                            placeholder.markdown("".join(stream_buffer))
+
+                        report = cached_generate_report(
+                            facility,
+                            study_type,
+                            tuple(sorted(sections_data.items())),
+                            image_digest,
+                            image_media_type,
+                            image_data,
+                            stream_token
+                        )
+                        placeholder.empty()
+
+                        report_container.text_area(
+                            "Generated Report",
+                            report,
+                            height=600
+                        )
+
+                        # Add download button - pass the str directly; Streamlit
+                        # encodes it on download instead of per rerun here
+                        report_container.download_button(
+                            "Download Report",
+                            report,
+                            "radiology_report.txt",
+                            "text/plain"
                         )
-                        if success:
-                            st.success(f"Facility '{new_facility_name}' added successfully")
-                            st.experimental_rerun()
-                        else:
-                            st.error("Failed to add facility")
                     except Exception as e:
-                        st.error(f"Error adding facility: {str(e)}")
+                        report_container.error(f"Error generating report: {str(e)}")
+                        logger.error(f"Report generation failed: {e}")
+
+
+def render_admin_page():
+    """The password-protected admin page."""
+    st.sidebar.info("Admin features are password protected")
+
+    # Verify once and remember the result in session state, so typing in
+    # the password box (which reruns the script per keystroke) doesn't
+    # evaluate the admin body - and its Supabase queries - on every edit
+    password = ""
+    if not st.session_state.get("admin_ok"):
+        password = st.sidebar.text_input("Enter admin password", type="password")
+        if password and hmac.compare_digest(
+            hashlib.sha256(password.encode()).hexdigest(), ADMIN_PASSWORD_HASH
+        ):
+            st.session_state["admin_ok"] = True
+
+    if not st.session_state.get("admin_ok"):
+        if password:
+            st.sidebar.error("Incorrect password")
+        return
+
+    st.sidebar.success("Admin access granted")
+
+    # Surface any background writes that completed since the last rerun
+    _drain_admin_writes()
+
+    admin_tabs = st.tabs(["Facilities", "Templates", "Impression Patterns", "Unmatched Findings"])
+
+    # The patterns and unmatched-findings queries are independent, so fire
+    # them in parallel here but don't block - each tab resolves its own
+    # future, so rendering the earlier tabs never waits on this data
+    admin_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    patterns_future = admin_executor.submit(load_impression_patterns)
+    unmatched_future = admin_executor.submit(load_unmatched_findings, 50)
+    admin_executor.shutdown(wait=False)
+
+    # Each tab body is a fragment, so interactions inside one tab rerun
+    # just that tab instead of the whole script (mutations still call
+    # st.rerun() to refresh everything after a write)
+
+    # New Facilities tab
+    @st.fragment
+    def facilities_tab():
+        _drain_admin_writes()
+        st.header("Facility Management")
+
+        # Add new facility
+        st.subheader("Add New Facility")
+
+        new_facility_name = st.text_input("Facility Name")
+        new_chest_template = st.text_area("Chest Technique Template",
+            placeholder="e.g., Thin section axial images were obtained through the chest using a GE Lightspeed scanner. No intravenous contrast was used.",
+            height=100)
+        new_abdomen_template = st.text_area("Abdomen Technique Template",
+            placeholder="e.g., Thin section axial images were obtained through the abdomen and pelvis using a GE Lightspeed scanner. No intravenous contrast was used.",
+            height=100)
+
+        if st.button("Add Facility"):
+            if new_facility_name and new_chest_template and new_abdomen_template:
+                submit_admin_write(
+                    supabase.add_facility,
+                    (new_facility_name, new_chest_template, new_abdomen_template),
+                    f"Facility '{new_facility_name}' added successfully",
+                    (load_facilities,),
+                )
+            else:
+                st.warning("Please fill in all fields")
+
+        # Display existing facilities
+        st.subheader("Existing Facilities")
+        try:
+            facilities, _, facility_by_name = load_facilities()
+            if facilities and len(facilities) > 0:
+                for i, facility in enumerate(facilities):
+                    with st.expander(f"{facility['name']}"):
+                        st.text_area(f"Chest Technique", facility["technique_template_chest"], height=100, key=f"chest_{i}")
+                        st.text_area(f"Abdomen Technique", facility["technique_template_abdomen"], height=100, key=f"abdomen_{i}")
+
+                        if st.button(f"Delete {facility['name']}", key=f"delete_{i}"):
+                            submit_admin_write(
+                                supabase.delete_facility,
+                                (facility['id'],),
+                                f"Facility '{facility['name']}' deleted successfully",
+                                (load_facilities,),
+                            )
+            else:
+                st.info("No facilities found. Add your first facility above.")
+        except Exception as e:
+            st.error(f"Error loading facilities: {str(e)}")
+
+    # Template Management tab (renamed from previous Templates tab)
+    @st.fragment
+    def templates_tab():
+        _drain_admin_writes()
+        st.header("Template Management")
+
+        # First select a facility to edit templates
+        try:
+            facilities, _, facility_by_name = load_facilities()
+            if facilities and len(facilities) > 0:
+                selected_facility = st.selectbox(
+                    "Select Facility to Edit Templates",
+                    options=[f["name"] for f in facilities],
+                    key="template_facility"
+                )
+
+                # Find the selected facility object via the precomputed index
+                selected_facility_obj = facility_by_name.get(selected_facility)
+
+                if selected_facility_obj:
+                    facility_id = selected_facility_obj.get('id')
+
+                    # Edit templates
+                    st.subheader(f"Edit Templates for {selected_facility}")
+
+                    updated_chest = st.text_area(
+                        "Chest Technique Template",
+                        selected_facility_obj.get("technique_template_chest", ""),
+                        height=150
+                    )
+
+                    updated_abdomen = st.text_area(
+                        "Abdomen and Pelvis Technique Template",
+                        selected_facility_obj.get("technique_template_abdomen", ""),
+                        height=150
+                    )
+
+                    if st.button("Update Templates"):
+                        submit_admin_write(
+                            supabase.update_facility_templates,
+                            (facility_id, updated_chest, updated_abdomen),
+                            f"Templates for {selected_facility} updated successfully",
+                            (load_facilities,),
+                        )
+            else:
+                st.info("No facilities found. Please add facilities in the Facilities tab first.")
+        except Exception as e:
+            st.error(f"Error loading facilities for template editing: {str(e)}")
+
+    # Impression Patterns tab (moved to third position)
+    @st.fragment
+    def patterns_tab():
+        _drain_admin_writes()
+        st.header("Impression Patterns")
+        try:
+            patterns = patterns_future.result()
+
+            # Display existing patterns
+            st.subheader("Existing Patterns")
+            if patterns and len(patterns) > 0:
+                for pattern in patterns:
+                    with st.expander(f"{pattern['section_name']}: {pattern['finding_pattern']}"):
+                        col1, col2 = st.columns([1, 3])
+                        with col1:
+                            st.write(f"**Section:** {pattern['section_name']}")
+                            st.write(f"**Pattern:** {pattern['finding_pattern']}")
+                        with col2:
+                            st.write(f"**Impression:** {pattern['impression_text']}")
+
+                        if st.button(f"Delete Pattern", key=f"delete_pattern_{pattern['id']}"):
+                            submit_admin_write(
+                                supabase.delete_impression_pattern,
+                                (pattern['id'],),
+                                "Pattern deleted successfully",
+                                (load_impression_patterns,),
+                            )
+            else:
+                st.info("No impression patterns found. Add your first pattern below.")
+
+            # Add new pattern
+            st.subheader("Add New Pattern")
+            new_section = st.selectbox("Section", ["chest", "abdomen_pelvis"])
+            new_pattern = st.text_input("Finding Pattern",
+                help="Enter a pattern to match in findings, e.g., 'liver is enlarged' or 'nodule in left lower lobe'")
+            new_impression = st.text_area("Impression Text",
+                help="Enter the impression text to generate for this finding pattern",
+                height=100)
+
+            if st.button("Add Pattern"):
+                if new_pattern and new_impression:
+                    submit_admin_write(
+                        supabase.add_impression_pattern,
+                        (new_pattern, new_section, new_impression),
+                        "Pattern added successfully",
+                        (load_impression_patterns,),
+                    )
                 else:
                     st.warning("Please fill in all fields")
-            
-            # Display existing facilities
-            st.subheader("Existing Facilities")
-            try:
-                facilities = supabase.get_facilities()
-                if facilities and len(facilities) > 0:
-                    for i, facility in enumerate(facilities):
-                        with st.expander(f"{facility['name']}"):
-                            st.text_area(f"Chest Technique", facility["technique_template_chest"], height=100, key=f"chest_{i}")
-                            st.text_area(f"Abdomen Technique", facility["technique_template_abdomen"], height=100, key=f"abdomen_{i}")
-                            
-                            if st.button(f"Delete {facility['name']}", key=f"delete_{i}"):
-                                try:
-                                    success = supabase.delete_facility(facility['id'])
-                                    if success:
-                                        st.success(f"Facility '{facility['name']}' deleted successfully")
-                                        st.experimental_rerun()
-                                    else:
-                                        st.error(f"Failed to delete facility '{facility['name']}'")
-                                except Exception as e:
-                                    st.error(f"Error deleting facility: {str(e)}")
-                else:
-                    st.info("No facilities found. Add your first facility above.")
-            except Exception as e:
-                st.error(f"Error loading facilities: {str(e)}")
-        
-        # Template Management tab (renamed from previous Templates tab)
-        with admin_tabs[1]:
-            st.header("Template Management")
-            
-            # First select a facility to edit templates
-            try:
-                if facilities and len(facilities) > 0:
-                    selected_facility = st.selectbox(
-                        "Select Facility to Edit Templates",
-                        options=[f["name"] for f in facilities],
-                        key="template_facility"
+        except Exception as e:
+            st.error(f"Error managing impression patterns: {str(e)}")
+
+    # Unmatched Findings tab (moved to fourth position)
+    @st.fragment
+    def unmatched_tab():
+        _drain_admin_writes()
+        st.header("Unmatched Findings")
+        try:
+            unmatched = unmatched_future.result()
+
+            if unmatched and len(unmatched) > 0:
+                st.write(f"Found {len(unmatched)} unmatched findings")
+
+                # One Arrow-backed dataframe replaces a widget per row -
+                # 50 findings previously meant ~200 widget protos per rerun
+                df = pd.DataFrame(unmatched)[["section_name", "finding", "created_at"]]
+                st.dataframe(df, use_container_width=True)
+
+                selected_rows = st.multiselect(
+                    "Select findings to promote or delete",
+                    options=list(range(len(unmatched))),
+                    format_func=lambda i: f"{unmatched[i]['section_name']}: {unmatched[i]['finding'][:60]}"
+                )
+
+                # Collect impression text per selected finding so several
+                # can be promoted to patterns with a single batched insert
+                promote_rows = []
+                for i in selected_rows:
+                    finding = unmatched[i]
+                    impression_text = st.text_area(
+                        f"Impression for: {finding['finding'][:60]}",
+                        key=f"promote_impression_{finding['id']}",
+                        height=100
                     )
-                    
-                    # Find the selected facility object
-                    selected_facility_obj = next((f for f in facilities if f["name"] == selected_facility), None)
-                    
-                    if selected_facility_obj:
-                        facility_id = selected_facility_obj.get('id')
-                        
-                        # Edit templates
-                        st.subheader(f"Edit Templates for {selected_facility}")
-                        
-                        updated_chest = st.text_area(
-                            "Chest Technique Template", 
-                            selected_facility_obj.get("technique_template_chest", ""),
-                            height=150
+                    if impression_text:
+                        promote_rows.append({
+                            "finding_pattern": finding['finding'],
+                            "section_name": finding['section_name'],
+                            "impression_text": impression_text
+                        })
+
+                if st.button("Delete Selected"):
+                    if selected_rows:
+                        ids = [unmatched[i]['id'] for i in selected_rows]
+
+                        def delete_all(ids=ids):
+                            # List comprehension so every delete is attempted
+                            # even if an earlier one fails
+                            return all([supabase.delete_unmatched_finding(i) for i in ids])
+
+                        submit_admin_write(
+                            delete_all,
+                            (),
+                            f"Deleted {len(ids)} unmatched findings",
+                            (load_unmatched_findings,),
                         )
-                        
-                        updated_abdomen = st.text_area(
-                            "Abdomen and Pelvis Technique Template",
-                            selected_facility_obj.get("technique_template_abdomen", ""),
-                            height=150
+                    else:
+                        st.warning("Select at least one finding to delete")
+
+                if st.button("Promote Selected"):
+                    if promote_rows:
+                        submit_admin_write(
+                            supabase.add_impression_patterns_bulk,
+                            (promote_rows,),
+                            f"Promoted {len(promote_rows)} findings to patterns",
+                            (load_impression_patterns,),
                         )
-                        
-                        if st.button("Update Templates"):
-                            try:
-                                success = supabase.update_facility_templates(
-                                    facility_id,
-                                    updated_chest,
-                                    updated_abdomen
-                                )
-                                if success:
-                                    st.success(f"Templates for {selected_facility} updated successfully")
-                                    st.experimental_rerun()
-                                else:
-                                    st.error("Failed to update templates")
-                            except Exception as e:
-                                st.error(f"Error updating templates: {str(e)}")
-                else:
-                    st.info("No facilities found. Please add facilities in the Facilities tab first.")
-            except Exception as e:
-                st.error(f"Error loading facilities for template editing: {str(e)}")
-        
-        # Impression Patterns tab (moved to third position)
-        with admin_tabs[2]:
-            st.header("Impression Patterns")
-            try:
-                patterns = supabase.get_all_impression_patterns()
-                
-                # Display existing patterns
-                st.subheader("Existing Patterns")
-                if patterns and len(patterns) > 0:
-                    for pattern in patterns:
-                        with st.expander(f"{pattern['section_name']}: {pattern['finding_pattern']}"):
-                            col1, col2 = st.columns([1, 3])
-                            with col1:
-                                st.write(f"**Section:** {pattern['section_name']}")
-                                st.write(f"**Pattern:** {pattern['finding_pattern']}")
-                            with col2:
-                                st.write(f"**Impression:** {pattern['impression_text']}")
-                            
-                            if st.button(f"Delete Pattern", key=f"delete_pattern_{pattern['id']}"):
-                                try:
-                                    success = supabase.delete_impression_pattern(pattern['id'])
-                                    if success:
-                                        st.success("Pattern deleted successfully")
-                                        st.experimental_rerun()
-                                    else:
-                                        st.error("Failed to delete pattern")
-                                except Exception as e:
-                                    st.error(f"Error deleting pattern: {str(e)}")
-                else:
-                    st.info("No impression patterns found. Add your first pattern below.")
-                
-                # Add new pattern
-                st.subheader("Add New Pattern")
-                new_section = st.selectbox("Section", ["chest", "abdomen_pelvis"])
-                new_pattern = st.text_input("Finding Pattern", 
-                    help="Enter a pattern to match in findings, e.g., 'liver is enlarged' or 'nodule in left lower lobe'")
-                new_impression = st.text_area("Impression Text", 
-                    help="Enter the impression text to generate for this finding pattern",
-                    height=100)
-                
-                if st.button("Add Pattern"):
-                    if new_pattern and new_impression:
-                        try:
-                            success = supabase.add_impression_pattern(new_pattern, new_section, new_impression)
-                            if success:
-                                st.success("Pattern added successfully")
-                                st.experimental_rerun()
-                            else:
-                                st.error("Failed to add pattern")
-                        except Exception as e:
-                            st.error(f"Error adding pattern: {str(e)}")
                     else:
-                        st.warning("Please fill in all fields")
-            except Exception as e:
-                st.error(f"Error managing impression patterns: {str(e)}")
-        
-        # Unmatched Findings tab (moved to fourth position)
-        with admin_tabs[3]:
-            st.header("Unmatched Findings")
-            try:
-                unmatched = supabase.get_unmatched_findings(limit=50)
-                
-                if unmatched and len(unmatched) > 0:
-                    st.write(f"Found {len(unmatched)} unmatched findings")
-                    
-                    for finding in unmatched:
-                        with st.expander(f"{finding['section_name']}: {finding['finding'][:50]}..."):
-                            st.write(f"**Section:** {finding['section_name']}")
-                            st.write(f"**Finding:** {finding['finding']}")
-                            st.write(f"**Date:** {finding['created_at'].split('T')[0] if 'T' in finding['created_at'] else finding['created_at']}")
-                            
-                            # Add a button to create a pattern from this finding
-                            if st.button(f"Create Pattern for this Finding", key=f"create_pattern_{finding['id']}"):
-                                # Pre-fill the pattern form and switch tabs
-                                if 'new_section' not in st.session_state:
-                                    st.session_state.new_section = finding['section_name']
-                                if 'new_pattern' not in st.session_state:
-                                    st.session_state.new_pattern = finding['finding']
-                                st.session_state.active_tab = 2  # Switch to the Impression Patterns tab (index 2)
-                                st.experimental_rerun()
-                            
-                            # Option to delete the unmatched finding
-                            if st.button(f"Delete Unmatched Finding", key=f"delete_unmatched_{finding['id']}"):
-                                try:
-                                    success = supabase.delete_unmatched_finding(finding['id'])
-                                    if success:
-                                        st.success("Unmatched finding deleted")
-                                        st.experimental_rerun()
-                                    else:
-                                        st.error("Failed to delete unmatched finding")
-                                except Exception as e:
-                                    st.error(f"Error deleting unmatched finding: {str(e)}")
-                else:
-                    st.info("No unmatched findings found. This is good - it means all findings have matching patterns!")
-            except Exception as e:
-                st.error(f"Error loading unmatched findings: {str(e)}")
-    else:
-        if password:
-            st.sidebar.error("Incorrect password")
\ No newline at end of file
+                        st.warning("Select at least one finding and enter its impression text")
+            else:
+                st.info("No unmatched findings found. This is good - it means all findings have matching patterns!")
+        except Exception as e:
+            st.error(f"Error loading unmatched findings: {str(e)}")
+
+    with admin_tabs[0]:
+        facilities_tab()
+    with admin_tabs[1]:
+        templates_tab()
+    with admin_tabs[2]:
+        patterns_tab()
+    with admin_tabs[3]:
+        unmatched_tab()
+
+
+# Set page config
+st.set_page_config(
+    page_title="RadReport AI",
+    page_icon="🏥",
+    layout="wide"
+)
+
+# Page switch lives at the top so the common path runs zero Admin code
+# (and the Admin path skips the whole report form)
+menu = ["Report Generator", "Admin"]
+choice = st.sidebar.selectbox("Select Page", menu)
+
+# Debug mode in sidebar - a fragment, so toggling it or running the
+# connection test doesn't rerun the rest of the app
+@st.fragment
+def debug_panel():
+    if 'debug_mode' not in st.session_state:
+        st.session_state.debug_mode = False
+    st.session_state.debug_mode = st.checkbox("Enable Debug Mode", value=st.session_state.debug_mode)
+    if st.session_state.debug_mode:
+        if st.button("Test Supabase Connection"):
+            connection_status = test_supabase_connection()
+            st.code(connection_status)
+
+with st.sidebar:
+    with st.expander("Debug Tools"):
+        debug_panel()
+
+# App title with separate subtitle in smaller text
+st.title("RadReport AI")
+st.markdown("<h3 style='margin-top:-15px; color: #6c757d;'>Multimodal Radiology Report Generator</h3>", unsafe_allow_html=True)
+
+if choice == "Report Generator":
+    render_report_page()
+else:
+    render_admin_page()
+
+# Add a footer with version info
+st.markdown("---")
+st.markdown("<div style='text-align: center; color: #6c757d;'>RadReport AI v1.0 | &copy; 2025</div>", unsafe_allow_html=True)
@@ -1,21 +1,208 @@
-import os
+import collections
 import requests
 import json
 import base64
+import random
+import re
+import textwrap
+import threading
 import time
-from dotenv import load_dotenv
 import logging
 
+from functools import lru_cache
+
+from .config import get_config
+
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Keep memo caches small - entries are full response strings
+CACHE_MAX_ENTRIES = 128
+
+# Bound in-flight Claude requests per process. Section formatting, image
+# analysis and impression calls now run on worker threads, and several
+# Streamlit sessions can generate at once - without a cap, bursts trip
+# Anthropic's rate limit and the 429 retries cost more than the
+# parallelism saves.
+CLAUDE_SEM = threading.BoundedSemaphore(4)
+
+# One keep-alive session shared by every Claude call, so repeat requests
+# reuse pooled TLS connections to api.anthropic.com instead of paying a
+# fresh TCP + TLS handshake per call. requests.Session is thread-safe for
+# concurrent requests, which is how the worker pools use it.
+CLAUDE_SESSION = requests.Session()
+CLAUDE_SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8),
+)
+
+
+class _RateLimiter:
+    """Thread-safe sliding-window request limiter.
+
+    Keeps outbound Claude calls under the account's RPM ceiling so the
+    limit is never discovered through a 429 - a rejected request costs a
+    full round-trip plus the backoff wait, while pre-throttling costs only
+    the residual wait. Workers sleep outside the lock (and outside
+    CLAUDE_SEM) so throttled threads don't stall in-flight requests.
+    """
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self._sent = collections.deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                if len(self._sent) < self.rpm:
+                    self._sent.append(now)
+                    return
+                wait = 60 - (now - self._sent[0])
+            logger.info(f"RPM ceiling reached, holding request for {wait:.1f}s")
+            time.sleep(wait)
+
+
+CLAUDE_LIMITER = _RateLimiter(get_config().claude_rpm)
+
+
+def _is_well_formed(line):
+    """True if a findings line already reads as a complete sentence.
+
+    Capitalized start and terminal punctuation is a deliberately cheap
+    test - anything it passes would come back from the formatting call
+    unchanged, so the call can be skipped outright.
+    """
+    line = line.strip()
+    return bool(line) and line[0].isupper() and line.endswith((".", "!", "?"))
+
+# System prompts hoisted to module constants so every call sends an
+# identical prefix - a requirement for Anthropic's prompt cache to hit
+SYSTEM_FORMATTER = "You are a radiology report assistant that helps format findings into proper medical terminology and grammar. You never change measurements or clinical observations."
+SYSTEM_VISION = "You are a radiology AI assistant that helps identify potential findings in medical images. You are conservative in your assessments and careful not to overinterpret single images."
+SYSTEM_IMPRESSION = "You are a radiology report assistant that generates appropriate impression text for findings. You follow standard radiological guidelines for follow-up recommendations."
+SYSTEM_IMPRESSION_JSON = SYSTEM_IMPRESSION + " You always respond with valid JSON."
+SYSTEM_CATEGORIZER = "You are a radiology report assistant that categorizes findings into appropriate sections. You match each finding to exactly one category from the provided list, using the exact category names given. You always respond with valid JSON."
+
+# User prompts as module-level templates: built once, with the source-file
+# indentation stripped so it is neither rebuilt per call nor sent (and
+# billed) as leading whitespace on every request
+PROMPT_FORMAT_FINDINGS = textwrap.dedent("""\
+    Please convert the radiology findings below into properly formatted, grammatically
+    correct complete sentences for a CT report section.
+
+    Return only the formatted findings with no additional commentary. Each finding should
+    be on its own line. Maintain all medical details exactly as provided.
+
+    Section: {section}
+
+    Findings:
+    {findings}""")
+
+PROMPT_ANALYZE_IMAGE = textwrap.dedent("""\
+    Please analyze this {study_type} CT scan image and provide any notable observations
+    that might complement the radiologist's findings. Focus only on obvious abnormalities
+    visible in this single image. Be conservative and specific in your assessment.
+
+    If you identify any clear abnormalities, describe them in detail including:
+    1. Location (which anatomical structure/region)
+    2. Size (if measurable)
+    3. Characteristics (density, shape, borders)
+    4. Significance (normal variant, potentially concerning, etc.)
+
+    If no significant abnormalities are evident, state that clearly.""")
+
+PROMPT_IMPRESSION = textwrap.dedent("""\
+    Generate an appropriate impression for the radiology finding below.
+
+    The impression should:
+    1. Be concise (typically 1-2 sentences)
+    2. Use standard radiological terminology
+    3. Include relevant clinical implications if appropriate
+    4. Suggest follow-up if needed based on standard guidelines
+
+    Return only the impression text with no additional commentary.
+
+    Section: {section_name}
+    Finding: {finding}""")
+
+PROMPT_IMPRESSIONS_BATCH = textwrap.dedent("""\
+    Generate an appropriate impression for each of the radiology findings
+    below. The section each finding belongs to is given in brackets.
+
+    Each impression should:
+    1. Be concise (typically 1-2 sentences)
+    2. Use standard radiological terminology
+    3. Include relevant clinical implications if appropriate
+    4. Suggest follow-up if needed based on standard guidelines
+
+    Return only a JSON array of impression strings, one per finding,
+    in the same order as the findings. No additional commentary.
+
+    Findings:
+    {findings_str}""")
+
+PROMPT_CATEGORIZE = textwrap.dedent("""\
+    Categorize each of the radiology findings below into the most appropriate
+    category from the list given. Each finding should be assigned to exactly
+    one category.
+
+    Return a JSON object mapping each finding (verbatim) to its chosen
+    category. Example: {{"finding text": "category name"}}. Output only
+    the JSON object.
+
+    Section: {section_name}
+
+    Available categories:
+    {categories_str}
+
+    Findings to categorize:
+    {findings_str}""")
 
 class ClaudeClient:
+    # Fallback parser for the legacy "Finding: ... / Category: ..." reply
+    # format - one C-level scan over the whole response instead of a
+    # Python loop with per-line strip/startswith/slice
+    _PAIR_RE = re.compile(r"Finding:\s*(.+?)\s*\n\s*Category:\s*(.+?)\s*(?:\n|$)")
+
     def __init__(self):
-        self.api_key = os.environ.get("CLAUDE_API_KEY")
+        config = get_config()
+        self.api_key = config.claude_key
         self.base_url = "https://api.anthropic.com/v1/messages"
-        self.model = "claude-3-7-sonnet-20250219"
+        # Sonnet for the quality-sensitive calls (findings prose, vision);
+        # Haiku for the short structured ones (impressions, categorization),
+        # which it handles comparably at a fraction of the latency and price
+        self.model = config.claude_model
+        self.model_fast = config.claude_model_fast
+        # All prompts run at temperature 0, so identical inputs produce
+        # identical outputs and the responses can be memoized safely
+        self._findings_cache = {}
+        self._impression_cache = {}
+        self._category_cache = {}
         logger.info(f"Initialized Claude client with model: {self.model}")
+
+    @staticmethod
+    def _cached_system(text):
+        """Build a system prompt block marked for Anthropic prompt caching.
+
+        The system prompts here are fixed per method, so flagging them with
+        ephemeral cache_control lets the API serve the prefix from its
+        prompt cache on repeat calls (cached reads bill at a fraction of
+        input-token price) instead of reprocessing it every request.
+        """
+        return [{
+            "type": "text",
+            "text": text,
+            "cache_control": {"type": "ephemeral"},
+        }]
+
+    @staticmethod
+    def _cache_put(cache, key, value):
+        if len(cache) >= CACHE_MAX_ENTRIES:
+            cache.pop(next(iter(cache)))
+        cache[key] = value
         
     def _make_api_request(self, payload):
         headers = {
@@ -33,12 +220,16 @@ class ClaudeClient:
         
         while retry_count < max_retries:
             try:
-                response = requests.post(
-                    self.base_url,
-                    headers=headers,
-                    json=payload,
-                    timeout=timeout
-                )
+                CLAUDE_LIMITER.acquire()
+                # Hold the semaphore only while the request is in flight,
+                # not during backoff sleeps
+                with CLAUDE_SEM:
+                    response = CLAUDE_SESSION.post(
+                        self.base_url,
+                        headers=headers,
+                        json=payload,
+                        timeout=timeout
+                    )
                 
                 if response.status_code == 200:
                     return response.json()
@@ -46,11 +237,20 @@ class ClaudeClient:
                     error_msg = f"API request failed with status code {response.status_code}: {response.text}"
                     logger.error(error_msg)
                     
-                    # If rate limited, wait and retry
+                    # If rate limited, wait and retry. Honor the server's
+                    # Retry-After when it exceeds our own backoff, and add
+                    # jitter so parallel workers don't retry in lockstep
                     if response.status_code == 429:
                         retry_count += 1
+                        retry_after = response.headers.get("retry-after")
                         wait_time = min(2 ** retry_count, 60)  # Exponential backoff
-                        logger.info(f"Rate limited. Retrying in {wait_time} seconds...")
+                        if retry_after:
+                            try:
+                                wait_time = max(float(retry_after), wait_time)
+                            except ValueError:
+                                pass
+                        wait_time += random.random()
+                        logger.info(f"Rate limited. Retrying in {wait_time:.1f} seconds...")
                         time.sleep(wait_time)
                         continue
                     
@@ -72,63 +272,181 @@ class ClaudeClient:
                     raise
         
         raise Exception("Failed to get a successful response after multiple retries")
-        
-    def process_findings(self, findings, section):
-        """Process findings text with Claude to correct grammar and format"""
+
+    def _stream_api_request(self, payload, on_text):
+        """Stream a messages request, invoking on_text for each text delta.
+
+        Returns the full concatenated text once the stream completes, so
+        callers get the same value as from a blocking request while the UI
+        can render tokens as they arrive. Rate limits and connection errors
+        retry with the same backoff as the blocking path - the error status
+        is known before any bytes stream, and retries stop once a delta has
+        been emitted so tokens are never replayed into the callback.
+        """
+        headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+
+        stream_payload = dict(payload)
+        stream_payload["stream"] = True
+
+        max_retries = 3
+        retry_count = 0
+
+        while retry_count < max_retries:
+            chunks = []
+            wait_time = None
+            try:
+                CLAUDE_LIMITER.acquire()
+                # Streaming occupies a connection for the whole response, so
+                # the semaphore is held until the stream is drained - but
+                # released before any backoff sleep
+                with CLAUDE_SEM, CLAUDE_SESSION.post(
+                    self.base_url,
+                    headers=headers,
+                    json=stream_payload,
+                    stream=True,
+                    timeout=60
+                ) as response:
+                    if response.status_code == 429:
+                        retry_count += 1
+                        retry_after = response.headers.get("retry-after")
+                        wait_time = min(2 ** retry_count, 60)
+                        if retry_after:
+                            try:
+                                wait_time = max(float(retry_after), wait_time)
+                            except ValueError:
+                                pass
+                        wait_time += random.random()
+                    elif response.status_code != 200:
+                        error_msg = f"API request failed with status code {response.status_code}: {response.text}"
+                        logger.error(error_msg)
+                        raise Exception(error_msg)
+                    else:
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            line = line.decode("utf-8")
+                            if not line.startswith("data:"):
+                                continue
+                            event = json.loads(line[len("data:"):].strip())
+                            event_type = event.get("type")
+                            if event_type == "content_block_delta":
+                                text = event.get("delta", {}).get("text", "")
+                                if text:
+                                    chunks.append(text)
+                                    on_text(text)
+                            elif event_type == "error":
+                                # A mid-stream error (e.g. overloaded_error)
+                                # means the buffer is truncated - fail loudly
+                                # rather than return it as complete text
+                                error = event.get("error", {})
+                                error_msg = (
+                                    f"API streaming error: {error.get('type')}: "
+                                    f"{error.get('message')}"
+                                )
+                                logger.error(error_msg)
+                                raise Exception(error_msg)
+                            elif event_type == "message_stop":
+                                break
+                        return "".join(chunks)
+            except requests.exceptions.RequestException as e:
+                # A failure after deltas reached the callback can't be
+                # retried without replaying text, so surface it instead
+                if chunks:
+                    raise
+                retry_count += 1
+                if retry_count >= max_retries:
+                    raise Exception(f"Streaming request failed after multiple retries: {e}")
+                logger.warning(f"Error during streaming request: {e}. Retrying ({retry_count}/{max_retries})...")
+                time.sleep(2)
+                continue
+
+            # Only the 429 path falls through to here; sleep with the
+            # semaphore released, then retry
+            logger.info(f"Rate limited. Retrying in {wait_time:.1f} seconds...")
+            time.sleep(wait_time)
+
+        raise Exception("Failed to get a successful response after multiple retries")
+
+    def process_findings(self, findings, section, on_text=None):
+        """Process findings text with Claude to correct grammar and format.
+
+        If on_text is given the response is streamed and the callback is
+        invoked per text delta, so the caller can show partial output
+        instead of blocking on the full completion.
+        """
         try:
-            prompt = f"""
-            Please convert these radiology findings into properly formatted, grammatically 
-            correct complete sentences for a {section} CT report:
-            
-            {findings}
-            
-            Return only the formatted findings with no additional commentary. Each finding should
-            be on its own line. Maintain all medical details exactly as provided.
-            """
+            # The fastest call is the one not made: nothing to format, or
+            # every line already a complete sentence, short-circuits here
+            if not findings.strip():
+                return ""
+            lines = [l for l in findings.splitlines() if l.strip()]
+            if all(_is_well_formed(l) for l in lines):
+                result = "\n".join(l.strip() for l in lines)
+                if on_text is not None:
+                    on_text(result)
+                return result
+
+            cache_key = (findings, section)
+            cached = self._findings_cache.get(cache_key)
+            if cached is not None:
+                # Replay the full text once so streaming callers still render
+                if on_text is not None:
+                    on_text(cached)
+                return cached
+            # Static instructions lead and the variable data trails, so the
+            # request prefix is identical across calls for prompt caching
+            prompt = PROMPT_FORMAT_FINDINGS.format(section=section, findings=findings)
             
             payload = {
                 "model": self.model,
                 "max_tokens": 1000,
                 "temperature": 0,
-                "system": "You are a radiology report assistant that helps format findings into proper medical terminology and grammar. You never change measurements or clinical observations.",
+                "system": self._cached_system(SYSTEM_FORMATTER),
                 "messages": [{"role": "user", "content": prompt}]
             }
-            
-            response = self._make_api_request(payload)
-            
-            return response["content"][0]["text"]
+
+            if on_text is not None:
+                result = self._stream_api_request(payload, on_text)
+            else:
+                response = self._make_api_request(payload)
+                result = response["content"][0]["text"]
+
+            self._cache_put(self._findings_cache, cache_key, result)
+            return result
         except Exception as e:
             logger.error(f"Error processing findings: {e}")
             raise
     
-    def analyze_image(self, image_data, study_type):
+    def analyze_image(self, image_data, study_type, media_type="image/jpeg"):
         """Process radiology image with Claude vision capabilities"""
         try:
-            prompt = f"""
-            Please analyze this {study_type} CT scan image and provide any notable observations 
-            that might complement the radiologist's findings. Focus only on obvious abnormalities
-            visible in this single image. Be conservative and specific in your assessment.
-            
-            If you identify any clear abnormalities, describe them in detail including:
-            1. Location (which anatomical structure/region)
-            2. Size (if measurable)
-            3. Characteristics (density, shape, borders)
-            4. Significance (normal variant, potentially concerning, etc.)
+            prompt = PROMPT_ANALYZE_IMAGE.format(study_type=study_type)
             
-            If no significant abnormalities are evident, state that clearly.
-            """
-            
-            # Ensure image_data is properly encoded
-            if not image_data.startswith("data:image"):
-                # If it's just base64 without the data URL prefix, add it
-                image_type = "image/jpeg"  # Assuming JPEG, adjust if needed
-                image_data = f"data:{image_type};base64,{image_data}"
+            # source.data must be raw base64 - the API rejects data URLs, so
+            # strip the wrapper if a caller passed one (the old code added
+            # the prefix here, which broke every image request and forced
+            # the expensive text-only fallback)
+            if image_data.startswith("data:"):
+                image_data = image_data.split(",", 1)[1]
+
+            # The base64 prefix encodes the magic bytes, so correct an
+            # inaccurate default media type without decoding the payload
+            if image_data.startswith("iVBOR"):
+                media_type = "image/png"
+            elif image_data.startswith("UklGR"):
+                media_type = "image/webp"
+            elif image_data.startswith("/9j/"):
+                media_type = "image/jpeg"
             
             payload = {
                 "model": self.model,
                 "max_tokens": 1000,
                 "temperature": 0,
-                "system": "You are a radiology AI assistant that helps identify potential findings in medical images. You are conservative in your assessments and careful not to overinterpret single images.",
+                "system": self._cached_system(SYSTEM_VISION),
                 "messages": [
                     {
                         "role": "user", 
@@ -136,8 +454,8 @@ class ClaudeClient:
                             {
                                 "type": "image", 
                                 "source": {
-                                    "type": "base64", 
-                                    "media_type": "image/jpeg", 
+                                    "type": "base64",
+                                    "media_type": media_type,
                                     "data": image_data
                                 }
                             },
@@ -191,85 +509,168 @@ class ClaudeClient:
     def generate_impression(self, finding, section_name):
         """Generate an appropriate impression for a finding using Claude"""
         try:
-            prompt = f"""
-            Generate an appropriate impression for the following radiology finding in the {section_name} section:
-            
-            Finding: {finding}
-            
-            The impression should:
-            1. Be concise (typically 1-2 sentences)
-            2. Use standard radiological terminology
-            3. Include relevant clinical implications if appropriate
-            4. Suggest follow-up if needed based on standard guidelines
-            
-            Return only the impression text with no additional commentary.
-            """
+            if not finding.strip():
+                return ""
+            cache_key = (finding, section_name)
+            cached = self._impression_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            prompt = PROMPT_IMPRESSION.format(section_name=section_name, finding=finding)
             
             payload = {
-                "model": self.model,
+                "model": self.model_fast,
                 "max_tokens": 150,
                 "temperature": 0,
-                "system": "You are a radiology report assistant that generates appropriate impression text for findings. You follow standard radiological guidelines for follow-up recommendations.",
+                "system": self._cached_system(SYSTEM_IMPRESSION),
                 "messages": [{"role": "user", "content": prompt}]
             }
             
             response = self._make_api_request(payload)
-            
-            return response["content"][0]["text"].strip()
+
+            result = response["content"][0]["text"].strip()
+            self._cache_put(self._impression_cache, cache_key, result)
+            return result
         except Exception as e:
             logger.error(f"Error generating impression: {e}")
             raise
     
+    def generate_impressions_batch(self, findings_with_sections):
+        """Generate impressions for several findings in one Claude call.
+
+        findings_with_sections is a list of (finding, section_name) tuples;
+        the returned list of impressions is in the same order. A single
+        call amortizes the system prompt and round-trip latency across all
+        findings instead of paying them once per finding. Cached findings
+        are served from memory and only the misses are sent.
+        """
+        results = [None] * len(findings_with_sections)
+        misses = []
+        for idx, (finding, section_name) in enumerate(findings_with_sections):
+            cached = self._impression_cache.get((finding, section_name))
+            if cached is not None:
+                results[idx] = cached
+            else:
+                misses.append(idx)
+
+        if not misses:
+            return results
+
+        try:
+            findings_str = "\n".join(
+                f"{n}. [{findings_with_sections[idx][1]}] {findings_with_sections[idx][0]}"
+                for n, idx in enumerate(misses, 1)
+            )
+
+            prompt = PROMPT_IMPRESSIONS_BATCH.format(findings_str=findings_str)
+
+            payload = {
+                "model": self.model_fast,
+                "max_tokens": 150 * len(misses),
+                "temperature": 0,
+                "system": self._cached_system(SYSTEM_IMPRESSION_JSON),
+                "messages": [{"role": "user", "content": prompt}]
+            }
+
+            response = self._make_api_request(payload)
+
+            text = response["content"][0]["text"].strip()
+            if text.startswith("```"):
+                # Strip a markdown code fence (with optional language tag)
+                text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+            parsed = json.loads(text)
+            if not isinstance(parsed, list) or len(parsed) != len(misses):
+                raise ValueError(f"Expected {len(misses)} impressions, got: {text[:200]}")
+
+            for idx, impression in zip(misses, parsed):
+                impression = str(impression).strip()
+                results[idx] = impression
+                finding, section_name = findings_with_sections[idx]
+                self._cache_put(self._impression_cache, (finding, section_name), impression)
+            return results
+        except Exception as e:
+            logger.warning(f"Batch impression generation failed, falling back to per-finding calls: {e}")
+            for idx in misses:
+                finding, section_name = findings_with_sections[idx]
+                results[idx] = self.generate_impression(finding, section_name)
+            return results
+
     def categorize_findings(self, findings, categories, section_name):
         """Use Claude to categorize findings into appropriate categories"""
         try:
+            if not findings:
+                return {}
+            # With a single allowed category there is nothing to decide
+            if len(categories) == 1:
+                return {finding: categories[0] for finding in findings}
+
+            # Serve previously categorized findings from memory and only
+            # send the misses - common findings recur verbatim across
+            # reports, and at temperature 0 the answer is deterministic.
+            # A cached category is only reused if it is still in the
+            # caller's allowed list.
+            result = {}
+            misses = []
+            for finding in findings:
+                cached = self._category_cache.get((finding, section_name))
+                if cached is not None and cached in categories:
+                    result[finding] = cached
+                else:
+                    misses.append(finding)
+
+            if not misses:
+                return result
+
             categories_str = "\n".join(categories)
-            findings_str = "\n".join([f"- {finding}" for finding in findings])
-            
-            prompt = f"""
-            Categorize each of the following radiology findings into the most appropriate category 
-            from the list below. Each finding should be assigned to exactly one category.
-            
-            Section: {section_name}
-            
-            Available categories:
-            {categories_str}
-            
-            Findings to categorize:
-            {findings_str}
-            
-            For each finding, return only the finding text and the selected category in this exact format:
-            Finding: [exact finding text]
-            Category: [exact category name from the list]
-            
-            Provide this for each finding, with one blank line between entries.
-            """
-            
+            findings_str = "\n".join([f"- {finding}" for finding in misses])
+
+            prompt = PROMPT_CATEGORIZE.format(
+                section_name=section_name,
+                categories_str=categories_str,
+                findings_str=findings_str,
+            )
+
             payload = {
-                "model": self.model,
+                "model": self.model_fast,
                 "max_tokens": 500,
                 "temperature": 0,
-                "system": "You are a radiology report assistant that categorizes findings into appropriate sections. You match each finding to exactly one category from the provided list, using the exact category names given.",
+                "system": self._cached_system(SYSTEM_CATEGORIZER),
                 "messages": [{"role": "user", "content": prompt}]
             }
-            
+
             response = self._make_api_request(payload)
-            
-            # Parse Claude's response to extract finding-to-category mappings
-            result = {}
-            current_finding = None
-            
-            for line in response["content"][0]["text"].strip().split('\n'):
-                line = line.strip()
-                if line.startswith('Finding:'):
-                    current_finding = line[len('Finding:'):].strip()
-                elif line.startswith('Category:') and current_finding:
-                    category = line[len('Category:'):].strip()
-                    if category in categories:  # Ensure category is in the allowed list
-                        result[current_finding] = category
-                    current_finding = None
-            
+
+            text = response["content"][0]["text"].strip()
+            if text.startswith("```"):
+                # Strip a markdown code fence (with optional language tag)
+                text = text.split("\n", 1)[1].rsplit("```", 1)[0]
+
+            parsed = None
+            try:
+                parsed = json.loads(text)
+            except json.JSONDecodeError:
+                logger.warning("Categorization response was not valid JSON, falling back to line parsing")
+
+            if isinstance(parsed, dict):
+                pairs = parsed.items()
+            else:
+                # Fallback: parse the legacy "Finding: ... / Category: ..." format
+                pairs = self._PAIR_RE.findall(text)
+
+            categories_set = set(categories)
+            for finding, category in pairs:
+                # Drop any category Claude invented outside the allowed list
+                if category in categories_set:
+                    result[finding] = category
+                    self._cache_put(self._category_cache, (finding, section_name), category)
+
             return result
         except Exception as e:
             logger.error(f"Error categorizing findings: {e}")
-            raise
\ No newline at end of file
+            raise
+
+@lru_cache(maxsize=1)
+def get_claude_client():
+    """Process-wide ClaudeClient singleton, so all callers share the same
+    response memo caches rather than warming private copies."""
+    return ClaudeClient()
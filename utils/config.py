@@ -0,0 +1,28 @@
+import os
+from functools import lru_cache
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+
+@lru_cache(maxsize=1)
+def get_config():
+    """Resolve environment configuration once per process.
+
+    Every module previously called load_dotenv() at import time and read
+    os.environ on each use; this caches a single .env parse and the three
+    values the app needs, so repeat lookups are attribute reads.
+    """
+    load_dotenv()
+    return SimpleNamespace(
+        supabase_url=os.environ.get("SUPABASE_URL"),
+        supabase_key=os.environ.get("SUPABASE_KEY"),
+        claude_key=os.environ.get("CLAUDE_API_KEY"),
+        # Model mix is overridable per deployment so the quality/cost
+        # trade-off can be tuned without a code change
+        claude_model=os.environ.get("CLAUDE_MODEL", "claude-3-7-sonnet-20250219"),
+        claude_model_fast=os.environ.get("CLAUDE_MODEL_FAST", "claude-3-5-haiku-latest"),
+        # Requests-per-minute ceiling for the account tier; the client
+        # pre-throttles to this rather than discovering it via 429s
+        claude_rpm=int(os.environ.get("CLAUDE_RPM", "50")),
+    )
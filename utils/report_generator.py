@@ -1,27 +1,49 @@
-from .supabase_client import SupabaseClient
-from .claude_client import ClaudeClient
+import concurrent.futures
+
+from .supabase_client import get_supabase_client
+from .claude_client import get_claude_client
+
+# Per-section report header and the facility field holding its technique
+# text; a dict lookup replaces branching on section names, so adding a
+# section is one entry here rather than another if/else arm
+SECTION_CONFIG = {
+    "chest": ("CT CHEST WITHOUT CONTRAST:", "technique_template_chest"),
+    "abdomen_pelvis": ("CT ABDOMEN AND PELVIS WITHOUT CONTRAST", "technique_template_abdomen"),
+}
 
 class ReportGenerator:
     def __init__(self):
-        self.supabase = SupabaseClient()
-        self.claude = ClaudeClient()
+        # Shared singletons - repeat construction would rebuild HTTP pools
+        # and start with cold response caches
+        self.supabase = get_supabase_client()
+        self.claude = get_claude_client()
         self.use_claude_for_unmatched = True  # Set to True to use Claude for unmatched findings
     
-    def generate_report(self, facility_name, study_type, sections_data, image_data=None):
+    def generate_report(self, facility_name, study_type, sections_data, image_data=None,
+                        image_media_type="image/jpeg", on_token=None):
         """
         Generate a complete radiology report with findings and impressions
-        
+
         Args:
             facility_name (str): Name of the imaging facility
             study_type (str): Type of study (Full Body, Chest, or Abdomen and Pelvis)
             sections_data (dict): Dictionary of section names to findings text
             image_data (str, optional): Base64-encoded image data
-            
+            image_media_type (str): MIME type of the encoded image
+            on_token (callable, optional): Called with each text delta while
+                Claude streams the formatted findings, for live UI updates
+
         Returns:
             str: The complete formatted radiology report
         """
+        # One RPC warms the facility/template/pattern caches for the active
+        # sections; when it isn't deployed, each getter fetches as before
+        self.supabase.preload_report_context(
+            [name for name, text in sections_data.items() if text and text.strip()]
+        )
+
         facilities = self.supabase.get_facilities()
-        
+
         # Find matching facility
         facility = next((f for f in facilities if f["name"] == facility_name), None)
         if not facility:
@@ -30,24 +52,73 @@ class ReportGenerator:
         report_sections = []
         impressions = []
         matched_findings = []  # Track findings that generated impressions
-        
+        pending_unmatched = []  # Unmatched findings awaiting a Claude impression
+        unmatched_log = []  # Buffered rows for one bulk unmatched-findings insert
+        seen_findings = set()  # Normalized findings already resolved this report
+
+        # The image analysis is independent of the text sections, so start
+        # it now and let it overlap the per-section Claude/Supabase work
+        # instead of running after everything else has finished
+        image_executor = None
+        image_future = None
+        if image_data:
+            image_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            image_future = image_executor.submit(
+                self.claude.analyze_image, image_data, study_type, image_media_type
+            )
+
+        # Format every section's findings concurrently before assembling the
+        # report - the per-section Claude calls are independent, so their
+        # combined latency is the slowest call rather than the sum. Only the
+        # first section streams tokens, keeping the live view readable.
+        active_sections = [
+            (name, text) for name, text in sections_data.items()
+            if text and text.strip() != ""
+        ]
+        processed_by_section = {}
+        templates_by_section = {}
+        if active_sections:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2 * len(active_sections)) as executor:
+                futures = {}
+                template_futures = {}
+                for name, text in active_sections[1:]:
+                    futures[name] = executor.submit(self.claude.process_findings, text, name, None)
+                for name, _ in active_sections:
+                    # Template fetches ride along on the same pool, so a cold
+                    # cache overlaps the Claude calls instead of serializing
+                    # ahead of the section loop
+                    template_futures[name] = executor.submit(self.supabase.get_report_template, name)
+                # The streamed section runs on the calling thread: on_token
+                # typically writes to UI machinery (Streamlit drops element
+                # writes from threads without a script-run context), so the
+                # callback must fire where the caller invoked us. The other
+                # sections and templates overlap with it on the pool.
+                first_name, first_text = active_sections[0]
+                processed_by_section[first_name] = self.claude.process_findings(
+                    first_text, first_name, on_token
+                )
+                for name, future in futures.items():
+                    processed_by_section[name] = future.result()
+                for name, future in template_futures.items():
+                    templates_by_section[name] = future.result()
+
         # Process each section
         for section_name, findings in sections_data.items():
             if not findings or findings.strip() == "":
                 continue
                 
-            # Get template for this section
-            template = self.supabase.get_report_template(section_name)
+            # Template was fetched concurrently with the Claude calls above
+            template = templates_by_section.get(section_name)
             if not template:
                 continue
             
-            # Create section header
-            if section_name == "chest":
-                report_sections.append("CT CHEST WITHOUT CONTRAST:")
-                technique = facility["technique_template_chest"]
-            else:
-                report_sections.append("CT ABDOMEN AND PELVIS WITHOUT CONTRAST")
-                technique = facility["technique_template_abdomen"]
+            # Create section header; unknown sections fall back to the
+            # abdomen/pelvis entry, as the old else branch did
+            header, technique_field = SECTION_CONFIG.get(
+                section_name, SECTION_CONFIG["abdomen_pelvis"]
+            )
+            report_sections.append(header)
+            technique = facility[technique_field]
             
             # Add technique section
             report_sections.append("TECHNIQUE:")
@@ -61,36 +132,46 @@ class ReportGenerator:
             # Clone default findings to keep originals intact
             modified_findings = dict(default_findings)
             
-            # Process each line of findings with Claude for grammar/formatting
-            processed_findings = self.claude.process_findings(findings, section_name)
+            # Each line of findings was already formatted by Claude above
+            processed_findings = processed_by_section[section_name]
             finding_lines = processed_findings.strip().split('\n')
             
             # Track which findings have been processed
             processed_finding_indexes = set()
-            
+
+            # Lowercase category names once per section and each finding
+            # once per line, rather than per (finding, category) pair
+            categories_lower = [(category.lower(), category) for category in default_findings]
+
             # First try to categorize findings by direct category match
             for idx, finding in enumerate(finding_lines):
-                for category in default_findings.keys():
+                finding_lower = finding.lower()
+                for category_lower, category in categories_lower:
                     # Check if the category name appears in the finding
-                    if category.lower() in finding.lower():
+                    if category_lower in finding_lower:
                         modified_findings[category] = finding
                         processed_finding_indexes.add(idx)
-                        
+
+                        # A finding repeated verbatim in the report resolves
+                        # once: duplicates neither add duplicate impressions
+                        # nor re-log or re-query the same unmatched text
+                        finding_key = finding.strip().lower()
+                        if finding_key in seen_findings:
+                            break
+                        seen_findings.add(finding_key)
+
                         # Look up impression for this finding
                         impression = self.supabase.get_impression(finding, section_name)
                         if impression:
                             impressions.append(impression)
                             matched_findings.append(finding)
                         else:
-                            # Log the unmatched finding
-                            self.supabase.log_unmatched_finding(finding, section_name)
-                            
-                            # Generate impression with Claude if enabled
+                            # Buffer for one bulk insert after the loop
+                            unmatched_log.append({"finding": finding, "section_name": section_name})
+
+                            # Queue for one batched Claude impression call
                             if self.use_claude_for_unmatched:
-                                claude_impression = self.claude.generate_impression(finding, section_name)
-                                if claude_impression:
-                                    impressions.append(claude_impression)
-                                    matched_findings.append(finding)
+                                pending_unmatched.append((finding, section_name))
                         break
             
             # For findings that didn't match any category, use Claude to categorize
@@ -108,22 +189,25 @@ class ReportGenerator:
                 for finding, suggested_category in categories.items():
                     if suggested_category in modified_findings:
                         modified_findings[suggested_category] = finding
-                        
+
+                        # Same duplicate guard as the direct-match path
+                        finding_key = finding.strip().lower()
+                        if finding_key in seen_findings:
+                            continue
+                        seen_findings.add(finding_key)
+
                         # Look up impression
                         impression = self.supabase.get_impression(finding, section_name)
                         if impression:
                             impressions.append(impression)
                             matched_findings.append(finding)
                         else:
-                            # Log the unmatched finding
-                            self.supabase.log_unmatched_finding(finding, section_name)
-                            
-                            # Generate impression with Claude if enabled
+                            # Buffer for one bulk insert after the loop
+                            unmatched_log.append({"finding": finding, "section_name": section_name})
+
+                            # Queue for one batched Claude impression call
                             if self.use_claude_for_unmatched:
-                                claude_impression = self.claude.generate_impression(finding, section_name)
-                                if claude_impression:
-                                    impressions.append(claude_impression)
-                                    matched_findings.append(finding)
+                                pending_unmatched.append((finding, section_name))
             
             # Output all categories with updated findings
             for category, text in modified_findings.items():
@@ -131,6 +215,20 @@ class ReportGenerator:
             
             report_sections.append("")
         
+        # One bulk insert logs every unmatched finding instead of an INSERT
+        # round-trip inside the finding loops
+        if unmatched_log:
+            self.supabase.log_unmatched_findings_bulk(unmatched_log)
+
+        # Generate impressions for every unmatched finding with one batched
+        # Claude call instead of a round-trip per finding
+        if pending_unmatched:
+            batch_impressions = self.claude.generate_impressions_batch(pending_unmatched)
+            for (finding, _), impression in zip(pending_unmatched, batch_impressions):
+                if impression:
+                    impressions.append(impression)
+                    matched_findings.append(finding)
+
         # Add impressions section
         if impressions:
             report_sections.append("IMPRESSION:")
@@ -140,10 +238,11 @@ class ReportGenerator:
             report_sections.append("IMPRESSION:")
             report_sections.append("Unremarkable exam.")
         
-        # Analyze image if provided
-        if image_data:
-            image_findings = self.claude.analyze_image(image_data, study_type)
-            
+        # Collect the image analysis started before the section loop
+        if image_future is not None:
+            image_findings = image_future.result()
+            image_executor.shutdown(wait=False)
+
             # If image analysis found something not in the text findings
             if image_findings and not image_findings.lower().startswith("no significant"):
                 report_sections.append("")
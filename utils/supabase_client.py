@@ -1,18 +1,36 @@
-import os
+import time
+from functools import lru_cache
+from types import MappingProxyType
+
 from supabase import create_client
-from dotenv import load_dotenv
 import logging
 
+from .config import get_config
+
+# Optional C-accelerated multi-pattern matcher; the substring scan falls
+# back to the plain Python loop when it isn't installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-load_dotenv()
+# Facilities and report templates are near-static configuration; serve
+# them from memory for this long before re-fetching
+CONFIG_CACHE_TTL = 300
+
+# Bound on memoized (finding, section) -> impression results; FIFO-evicted
+# so repeated findings across reports short-circuit the matcher entirely
+IMPRESSION_MEMO_MAX = 2048
 
 class SupabaseClient:
     def __init__(self):
-        url = os.environ.get("SUPABASE_URL")
-        key = os.environ.get("SUPABASE_KEY")
+        config = get_config()
+        url = config.supabase_url
+        key = config.supabase_key
         
         if not url or not key:
             logger.error("Supabase URL or key is missing in environment variables")
@@ -20,21 +38,86 @@ class SupabaseClient:
             
         try:
             self.client = create_client(url, key)
-            # Test connection by fetching a simple query
-            self.client.table("facilities").select("count", count="exact").execute()
-            logger.info("Successfully connected to Supabase")
+            self._enable_http2_transport()
+            self._config_cache = {}
+            self._impression_memo = {}
+            logger.info("Initialized Supabase client")
         except Exception as e:
-            logger.error(f"Failed to connect to Supabase: {e}")
+            logger.error("Failed to initialize Supabase client: %s", e)
             raise
+
+    def health_check(self):
+        """Probe the connection with a cheap count query.
+
+        Construction used to run this probe unconditionally, costing a
+        round-trip before any real work; callers that want a liveness
+        check now ask for it explicitly.
+        """
+        self.client.table("facilities").select("count", count="exact").execute()
+        return True
+
+    def _config_cache_get(self, key):
+        entry = self._config_cache.get(key)
+        if entry is not None and time.monotonic() - entry[0] < CONFIG_CACHE_TTL:
+            return entry[1]
+        return None
+
+    def _config_cache_set(self, key, value):
+        self._config_cache[key] = (time.monotonic(), value)
+
+    def invalidate_config_cache(self):
+        """Drop cached facilities/templates after a write so the next read
+        reflects it immediately instead of waiting out the TTL."""
+        self._config_cache.clear()
+        self._impression_memo.clear()
+
+    def _enable_http2_transport(self):
+        """Swap the PostgREST session for an HTTP/2, keep-alive httpx client.
+
+        All REST calls then multiplex over one socket and responses are
+        gzip/brotli-compressed, instead of paying a fresh HTTP/1.1 TLS
+        connection and uncompressed JSON per query. When the h2 package
+        is missing the keep-alive pool and compression are still applied
+        on an HTTP/1.1 client; only if httpx itself can't be configured
+        does the default transport remain.
+        """
+        try:
+            import httpx
+            old_session = self.client.postgrest.session
+            client_kwargs = dict(
+                base_url=old_session.base_url,
+                headers={**old_session.headers, "Accept-Encoding": "gzip, br"},
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=30),
+            )
+            try:
+                self.client.postgrest.session = httpx.Client(http2=True, **client_kwargs)
+                logger.info("Enabled HTTP/2 transport for Supabase REST calls")
+            except ImportError as e:
+                # http2=True requires h2; keep-alive and compression still
+                # pay for themselves on HTTP/1.1
+                self.client.postgrest.session = httpx.Client(**client_kwargs)
+                logger.warning("h2 unavailable (%s); using HTTP/1.1 with keep-alive and compression", e)
+        except Exception as e:
+            logger.warning("Could not enable HTTP/2 transport, using default: %s", e)
     
     def get_facilities(self):
-        """Get all facilities from the database"""
+        """Get all facilities from the database.
+
+        Only the columns the app reads are selected, keeping the JSON
+        payload (and the cache entries built from it) small.
+        """
         try:
-            response = self.client.table("facilities").select("*").execute()
-            logger.info(f"Retrieved {len(response.data)} facilities")
+            cached = self._config_cache_get("facilities")
+            if cached is not None:
+                return cached
+            response = self.client.table("facilities") \
+                .select("id,name,technique_template_chest,technique_template_abdomen") \
+                .execute()
+            logger.info("Retrieved %d facilities", len(response.data))
+            self._config_cache_set("facilities", response.data)
             return response.data
         except Exception as e:
-            logger.error(f"Error retrieving facilities: {e}")
+            logger.error("Error retrieving facilities: %s", e)
             raise
     
     def add_facility(self, name, technique_template_chest, technique_template_abdomen):
@@ -45,20 +128,22 @@ class SupabaseClient:
                 "technique_template_chest": technique_template_chest,
                 "technique_template_abdomen": technique_template_abdomen
             }).execute()
-            logger.info(f"Added new facility: {name}")
+            logger.info("Added new facility: %s", name)
+            self.invalidate_config_cache()
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error adding facility: {e}")
+            logger.error("Error adding facility: %s", e)
             return False
     
     def delete_facility(self, facility_id):
         """Delete a facility from the database"""
         try:
             response = self.client.table("facilities").delete().eq("id", facility_id).execute()
-            logger.info(f"Deleted facility with ID: {facility_id}")
+            logger.info("Deleted facility with ID: %s", facility_id)
+            self.invalidate_config_cache()
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error deleting facility: {e}")
+            logger.error("Error deleting facility: %s", e)
             return False
     
     def update_facility_templates(self, facility_id, technique_template_chest, technique_template_abdomen):
@@ -69,78 +154,240 @@ class SupabaseClient:
                 "technique_template_abdomen": technique_template_abdomen,
                 "updated_at": "now()"
             }).eq("id", facility_id).execute()
-            logger.info(f"Updated templates for facility with ID: {facility_id}")
+            logger.info("Updated templates for facility with ID: %s", facility_id)
+            self.invalidate_config_cache()
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error updating facility templates: {e}")
+            logger.error("Error updating facility templates: %s", e)
             return False
     
     def get_report_template(self, section_name):
-        """Get report template for a specific section"""
+        """Get report template for a specific section.
+
+        Only the fields report generation reads are selected; the
+        default_findings JSON dominates the row anyway, so nothing else
+        needs to ride along.
+        """
         try:
+            cache_key = ("template", section_name)
+            cached = self._config_cache_get(cache_key)
+            if cached is not None:
+                return cached
             response = self.client.table("report_templates") \
-                         .select("*") \
+                         .select("section_name,default_findings") \
                          .eq("section_name", section_name) \
                          .execute()
-            return response.data[0] if response.data else None
+            template = response.data[0] if response.data else None
+            if template is not None:
+                # The cached row is shared across reports; a read-only view
+                # of default_findings turns accidental mutation into a
+                # TypeError instead of silently poisoning later reports
+                template["default_findings"] = MappingProxyType(template["default_findings"])
+                self._config_cache_set(cache_key, template)
+            return template
         except Exception as e:
-            logger.error(f"Error getting report template: {e}")
+            logger.error("Error getting report template: %s", e)
             raise
     
+    def preload_report_context(self, section_names):
+        """Warm the facility/template/pattern caches with one RPC.
+
+        A cold report generation otherwise pays one round-trip each for
+        the facilities, every section's template and every section's
+        patterns. The generate_report_context SQL function returns all of
+        it as one JSON object; this seeds the same cache keys the
+        individual getters use, so the rest of the pipeline is unchanged.
+        Returns False when the function isn't deployed, in which case the
+        getters fetch individually as before.
+
+        The function, for reference:
+
+            create or replace function generate_report_context(sections text[])
+            returns json as $$
+              select json_build_object(
+                'facilities', (select coalesce(json_agg(f), '[]') from (
+                    select id, name, technique_template_chest, technique_template_abdomen
+                    from facilities) f),
+                'templates', (select coalesce(json_agg(t), '[]') from (
+                    select section_name, default_findings from report_templates
+                    where section_name = any(sections)) t),
+                'patterns', (select coalesce(json_agg(p), '[]') from (
+                    select section_name, finding_pattern, impression_text
+                    from impression_lookup
+                    where section_name = any(sections)) p))
+            $$ language sql stable;
+        """
+        section_names = list(section_names)
+        wanted = ["facilities"]
+        wanted += [("template", s) for s in section_names]
+        wanted += [("patterns", s) for s in section_names]
+        if all(self._config_cache_get(key) is not None for key in wanted):
+            # Warm path: everything is already cached, skip the round-trip
+            return True
+
+        try:
+            context = self.client.rpc(
+                "generate_report_context", {"sections": section_names}
+            ).execute().data
+            self._config_cache_set("facilities", context["facilities"])
+            templates = {t["section_name"]: t for t in context["templates"]}
+            patterns_by_section = {s: [] for s in section_names}
+            for pattern in context["patterns"]:
+                patterns_by_section.setdefault(pattern["section_name"], []).append(pattern)
+            for section in section_names:
+                if section in templates:
+                    template = templates[section]
+                    # Same read-only guard as get_report_template applies
+                    template["default_findings"] = MappingProxyType(template["default_findings"])
+                    self._config_cache_set(("template", section), template)
+                self._config_cache_set(("patterns", section), patterns_by_section[section])
+            logger.info("Preloaded report context in one round-trip")
+            return True
+        except Exception as e:
+            logger.warning("generate_report_context RPC unavailable, using per-query fetches: %s", e)
+            return False
+
+    def get_impression_patterns_for_section(self, section_name):
+        """Return one section's impression patterns, cached in-process.
+
+        get_impression runs once per finding, and fetching the section's
+        whole pattern table from PostgREST each time made report latency
+        O(findings) in round-trips. The list is cached alongside the other
+        config reads and invalidated by pattern writes.
+        """
+        cache_key = ("patterns", section_name)
+        cached = self._config_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        response = self.client.table("impression_lookup") \
+                    .select("section_name,finding_pattern,impression_text") \
+                    .eq("section_name", section_name) \
+                    .execute()
+        self._config_cache_set(cache_key, response.data)
+        return response.data
+
+    def _get_section_matcher(self, section_name):
+        """Prebuilt matching structures for a section's patterns.
+
+        Returns (exact, automaton, prepared): a dict for O(1) exact
+        lookups, an optional Aho-Corasick automaton that finds every
+        pattern occurring in a finding in one pass over its characters,
+        and prepared per-pattern tuples (pattern_lower, word_frozenset,
+        length, impression_text) for the fallback passes. Lowercasing and
+        word-splitting happen here, once per cache fill, instead of per
+        record per finding in the match loops.
+        """
+        cache_key = ("matcher", section_name)
+        cached = self._config_cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        rows = self.get_impression_patterns_for_section(section_name)
+        exact = {}
+        prepared = []
+        for record in rows:
+            pattern_lower = record["finding_pattern"].lower()
+            exact.setdefault(pattern_lower, record["impression_text"])
+            prepared.append((
+                pattern_lower,
+                frozenset(pattern_lower.split()),
+                len(pattern_lower),
+                record["impression_text"],
+            ))
+
+        automaton = None
+        if ahocorasick is not None and prepared:
+            automaton = ahocorasick.Automaton()
+            for pattern_lower, _, pattern_len, impression_text in prepared:
+                automaton.add_word(pattern_lower, (pattern_len, pattern_lower, impression_text))
+            automaton.make_automaton()
+
+        matcher = (exact, automaton, prepared)
+        self._config_cache_set(cache_key, matcher)
+        return matcher
+
     def get_impression(self, finding, section_name):
-        """Match a finding to appropriate impression text using pattern matching."""
+        """Match a finding to appropriate impression text using pattern matching.
+
+        Results are memoized per (finding, section) - including misses, so a
+        finding that matched nothing isn't re-scanned on every report it
+        appears in. The memo is cleared alongside the config cache whenever
+        patterns are written.
+        """
         try:
-            # First get all patterns for this section
-            response = self.client.table("impression_lookup") \
-                        .select("*") \
-                        .eq("section_name", section_name) \
-                        .execute()
-            
-            if not response.data:
-                return None
-            
-            # Try exact matches first
             finding_lower = finding.lower()
-            for record in response.data:
-                if record["finding_pattern"].lower() == finding_lower:
-                    return record["impression_text"]
-            
-            # No exact match, try partial matches with scoring
-            matches = []
-            for record in response.data:
-                pattern = record["finding_pattern"].lower()
+            memo_key = (finding_lower, section_name)
+            memo = self._impression_memo
+            if memo_key in memo:
+                return memo[memo_key]
+
+            result = self._match_impression(finding_lower, section_name)
+
+            if len(memo) >= IMPRESSION_MEMO_MAX:
+                memo.pop(next(iter(memo)))
+            memo[memo_key] = result
+            return result
+        except Exception as e:
+            logger.error("Error matching impression: %s", e)
+            return None
+
+    def _match_impression(self, finding_lower, section_name):
+        """Run the pattern-matching passes for an already-lowercased finding."""
+        # Patterns come from the per-section cache, so matching is
+        # purely in-process on warm calls
+        exact, automaton, patterns = self._get_section_matcher(section_name)
+
+        if not patterns:
+            return None
+
+        # Try exact matches first
+        impression = exact.get(finding_lower)
+        if impression is not None:
+            return impression
+
+        # No exact match, try partial matches with scoring
+        matches = []
+        if automaton is not None:
+            # One C-level scan enumerates every pattern contained in
+            # the finding; scoring is unchanged
+            for _, (pattern_len, pattern, impression_text) in automaton.iter(finding_lower):
+                score = pattern_len
+                # Bonus points if the pattern is at the beginning of the finding
+                if finding_lower.startswith(pattern):
+                    score += 5
+                matches.append((score, impression_text))
+        else:
+            for pattern, _, pattern_len, impression_text in patterns:
                 if pattern in finding_lower:
                     # Score based on pattern length and position in the finding
-                    score = len(pattern)
+                    score = pattern_len
                     # Bonus points if the pattern is at the beginning of the finding
                     if finding_lower.startswith(pattern):
                         score += 5
-                    matches.append((score, record["impression_text"]))
-            
-            # Return the best match if any
-            if matches:
-                # Sort by score (highest first)
-                matches.sort(reverse=True, key=lambda x: x[0])
-                return matches[0][1]
-            
-            # Try partial word matching as a last resort
-            words = finding_lower.split()
-            for record in response.data:
-                pattern_words = record["finding_pattern"].lower().split()
-                common_words = set(words).intersection(set(pattern_words))
-                if len(common_words) >= min(2, len(pattern_words)):
-                    matches.append((len(common_words), record["impression_text"]))
-            
-            if matches:
-                matches.sort(reverse=True, key=lambda x: x[0])
-                return matches[0][1]
-            
-            # No match found
-            return None
-        except Exception as e:
-            logger.error(f"Error matching impression: {e}")
-            return None
-    
+                    matches.append((score, impression_text))
+
+        # Return the best match if any; only the top score matters, so a
+        # single max() pass replaces sorting the whole list (ties still
+        # resolve to the first match seen, as the stable sort did)
+        if matches:
+            return max(matches, key=lambda x: x[0])[1]
+
+        # Try partial word matching as a last resort. Counting membership
+        # hits in one pass avoids materializing an intersection set per
+        # pattern just to take its length.
+        finding_words = set(finding_lower.split())
+        for _, pattern_words, _, impression_text in patterns:
+            common_count = sum(1 for word in pattern_words if word in finding_words)
+            if common_count >= min(2, len(pattern_words)):
+                matches.append((common_count, impression_text))
+
+        if matches:
+            return max(matches, key=lambda x: x[0])[1]
+
+        # No match found
+        return None
+
+
     def log_unmatched_finding(self, finding, section_name):
         """Log findings that didn't match any pattern for future pattern additions"""
         try:
@@ -148,20 +395,36 @@ class SupabaseClient:
                 "finding": finding,
                 "section_name": section_name
             }).execute()
-            logger.info(f"Logged unmatched finding in section {section_name}")
+            logger.info("Logged unmatched finding in section %s", section_name)
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error logging unmatched finding: {e}")
+            logger.error("Error logging unmatched finding: %s", e)
             return False
     
+    def log_unmatched_findings_bulk(self, rows):
+        """Log several unmatched findings in a single PostgREST call.
+
+        Each row is a dict with finding and section_name keys; one array
+        insert replaces a round-trip per finding.
+        """
+        try:
+            if not rows:
+                return True
+            response = self.client.table("unmatched_findings").insert(rows).execute()
+            logger.info("Logged %d unmatched findings in one batch", len(rows))
+            return True if response.data else False
+        except Exception as e:
+            logger.error("Error logging unmatched findings in bulk: %s", e)
+            return False
+
     def delete_unmatched_finding(self, finding_id):
         """Delete an unmatched finding from the database"""
         try:
             response = self.client.table("unmatched_findings").delete().eq("id", finding_id).execute()
-            logger.info(f"Deleted unmatched finding with ID: {finding_id}")
+            logger.info("Deleted unmatched finding with ID: %s", finding_id)
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error deleting unmatched finding: {e}")
+            logger.error("Error deleting unmatched finding: %s", e)
             return False
     
     def add_impression_pattern(self, finding_pattern, section_name, impression_text):
@@ -172,30 +435,52 @@ class SupabaseClient:
                 "section_name": section_name,
                 "impression_text": impression_text
             }).execute()
-            logger.info(f"Added new impression pattern: {finding_pattern}")
+            logger.info("Added new impression pattern: %s", finding_pattern)
+            self.invalidate_config_cache()
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error adding impression pattern: {e}")
+            logger.error("Error adding impression pattern: %s", e)
             return False
     
+    def add_impression_patterns_bulk(self, rows):
+        """Add multiple impression patterns in a single PostgREST call.
+
+        Each row is a dict with finding_pattern, section_name and
+        impression_text keys. PostgREST accepts an array body natively,
+        so N patterns cost one round-trip instead of N.
+        """
+        try:
+            if not rows:
+                return True
+            response = self.client.table("impression_lookup").insert(rows).execute()
+            logger.info("Added %d impression patterns in one batch", len(rows))
+            self.invalidate_config_cache()
+            return True if response.data else False
+        except Exception as e:
+            logger.error("Error adding impression patterns in bulk: %s", e)
+            return False
+
     def delete_impression_pattern(self, pattern_id):
         """Delete an impression pattern from the database"""
         try:
             response = self.client.table("impression_lookup").delete().eq("id", pattern_id).execute()
-            logger.info(f"Deleted impression pattern with ID: {pattern_id}")
+            logger.info("Deleted impression pattern with ID: %s", pattern_id)
+            self.invalidate_config_cache()
             return True if response.data else False
         except Exception as e:
-            logger.error(f"Error deleting impression pattern: {e}")
+            logger.error("Error deleting impression pattern: %s", e)
             return False
     
     def get_all_impression_patterns(self):
         """Get all impression patterns from the database"""
         try:
-            response = self.client.table("impression_lookup").select("*").execute()
-            logger.info(f"Retrieved {len(response.data)} impression patterns")
+            response = self.client.table("impression_lookup") \
+                .select("id,section_name,finding_pattern,impression_text") \
+                .execute()
+            logger.info("Retrieved %d impression patterns", len(response.data))
             return response.data
         except Exception as e:
-            logger.error(f"Error retrieving impression patterns: {e}")
+            logger.error("Error retrieving impression patterns: %s", e)
             raise
     
     def get_unmatched_findings(self, limit=100):
@@ -206,8 +491,17 @@ class SupabaseClient:
                         .order("created_at", desc=True) \
                         .limit(limit) \
                         .execute()
-            logger.info(f"Retrieved {len(response.data)} unmatched findings")
+            logger.info("Retrieved %d unmatched findings", len(response.data))
             return response.data
         except Exception as e:
-            logger.error(f"Error retrieving unmatched findings: {e}")
-            raise
\ No newline at end of file
+            logger.error("Error retrieving unmatched findings: %s", e)
+            raise
+
+@lru_cache(maxsize=1)
+def get_supabase_client():
+    """Process-wide SupabaseClient singleton.
+
+    Repeated construction would rebuild the HTTP/2 transport and its
+    keep-alive pool; every caller shares one authenticated session instead.
+    """
+    return SupabaseClient()